@@ -1,21 +1,38 @@
 import logging
 import asyncio
+import atexit
 import os
 import json
+import queue
+import sys
+import threading
+import time
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
+    AIORateLimiter,
     Application,
     ApplicationBuilder,
+    BaseUpdateProcessor,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
+    ChatMemberHandler,
     ContextTypes,
     filters,
 )
 from firebase_admin import firestore, initialize_app, credentials
+from google.api_core.exceptions import AlreadyExists
+
+try:
+    import uvloop
+except ImportError:  # not available on Windows
+    uvloop = None
 
 # -------------------------------
 # 🔥 Firebase Initialization
@@ -30,10 +47,10 @@ if firebase_json:
         logging.info("Firebase initialized successfully")
     except ValueError as e:
         if "already initialized" not in str(e).lower():
-            logging.error(f"Firebase initialization error: {e}")
+            logging.error("Firebase initialization error: %s", e)
         pass  # already initialized
     except Exception as e:
-        logging.error(f"Firebase setup error: {e}")
+        logging.error("Firebase setup error: %s", e)
         raise
 else:
     logging.error("FIREBASE_CREDENTIALS environment variable not found")
@@ -44,118 +61,313 @@ db = firestore.client()
 # -------------------------------
 # ⚡ Logging Configuration
 # -------------------------------
+# Records are formatted by the caller and written to stderr by a listener
+# thread, so handlers never block the event loop on log I/O
+_log_queue = queue.SimpleQueue()
 logging.basicConfig(
     format="%(asctime)s - [%(levelname)s] %(name)s - %(message)s",
-    level=logging.INFO
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    handlers=[QueueHandler(_log_queue)],
+    force=True,
 )
+_log_listener = QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
 
 # -------------------------------
 # 📊 Database Operations
 # -------------------------------
+_groups_version = 0  # bumped whenever a group is saved
+_saved_group_names: dict = {}  # group_id -> group_name last written by this process
+_registered_groups: set = set()  # group ids known to exist in Firestore
+_inviters_versions: dict = {}  # group_id -> bumped whenever an inviter is written
+_top_inviters_cache: dict = {}  # (group_id, limit) -> (inviters version, top inviters)
+
+CACHE_TTL = 30  # seconds
+
+_groups_cache = {"data": None, "ts": 0.0, "live": False, "watch": None}  # live: synced by watch_groups
+_groups_cache_lock = threading.Lock()
+_groups_loaded = threading.Event()  # set once watch_groups delivers its first snapshot
+GROUPS_LOAD_TIMEOUT = 10  # seconds to wait for it at startup
+
+
+def bump_inviters_version(group_id: int) -> None:
+    """Invalidate cached leaderboards of a group after an inviter write"""
+    _inviters_versions[group_id] = _inviters_versions.get(group_id, 0) + 1
+
+
 def save_group_to_db(group_id: int, group_name: str) -> None:
-    """Store or update group information in Firestore"""
+    """Store or update group information in Firestore, skipping unchanged groups"""
+    global _groups_version
+    if _saved_group_names.get(group_id) == group_name:
+        return
+    
     try:
         ref = db.collection("groups").document(str(group_id))
-        ref.set(
-            {
+        try:
+            # New groups start with live counters, so they never need the
+            # legacy backfill in get_group_statistics
+            ref.create({
                 "group_name": group_name,
                 "group_id": group_id,
-                "added_on": datetime.utcnow(),
-                "last_updated": datetime.utcnow()
-            },
-            merge=True,
-        )
-        logger.info(f"Group saved: {group_name} ({group_id})")
+                "added_on": firestore.SERVER_TIMESTAMP,
+                "last_updated": firestore.SERVER_TIMESTAMP,
+                "join_counters": True,
+                "inviter_counters": True,
+            })
+        except AlreadyExists:
+            ref.set(
+                {
+                    "group_name": group_name,
+                    "group_id": group_id,
+                    "last_updated": firestore.SERVER_TIMESTAMP
+                },
+                merge=True,
+            )
+        _saved_group_names[group_id] = group_name
+        _registered_groups.add(group_id)
+        with _groups_cache_lock:
+            _groups_cache["ts"] = 0.0
+            if _groups_cache["data"] is not None:
+                # Copied rather than mutated, callers may be iterating the old dict
+                groups = dict(_groups_cache["data"])
+                groups[group_id] = {**groups.get(group_id, {}), "group_name": group_name, "group_id": group_id}
+                _groups_cache["data"] = groups
+            # Bumped after the cache holds the new group, for build_group_menu
+            _groups_version += 1
+        logger.info("Group saved: %s (%s)", group_name, group_id)
     except Exception as e:
-        logger.error(f"Error saving group {group_id}: {e}")
+        logger.error("Error saving group %s: %s", group_id, e)
         raise
 
 
+def ensure_group_registered(group_id: int, group_name: str) -> None:
+    """Register a group unless it already has a document in Firestore"""
+    if group_id in _registered_groups:
+        return
+    
+    snapshot = db.collection("groups").document(str(group_id)).get(field_paths=["group_id"])
+    if not snapshot.exists:
+        save_group_to_db(group_id, group_name)
+    _registered_groups.add(group_id)
+
+
 def get_all_groups_from_db() -> dict:
-    """Retrieve all groups from Firestore"""
+    """Retrieve all groups, kept current by watch_groups or cached for CACHE_TTL seconds"""
+    with _groups_cache_lock:
+        watch = _groups_cache["watch"]
+        # A listener that stopped streaming leaves the cache on the TTL again
+        live = _groups_cache["live"] and watch is not None and watch.is_active
+        if _groups_cache["data"] is not None and (
+            live or time.monotonic() - _groups_cache["ts"] < CACHE_TTL
+        ):
+            return _groups_cache["data"]
+        
+        try:
+            docs = db.collection("groups").select(["group_name"]).stream()
+            groups = {int(doc.id): doc.to_dict() for doc in docs}
+        except Exception as e:
+            logger.error("Error fetching groups: %s", e)
+            return {}
+        
+        _groups_cache.update(data=groups, ts=time.monotonic())
+        return groups
+
+
+def _on_groups_snapshot(snapshots, changes, read_time) -> None:
+    """Apply added, modified and removed groups to the cached groups"""
+    global _groups_version
+    with _groups_cache_lock:
+        # The first snapshot lists every group as added, so it replaces
+        # whatever the TTL path cached before
+        first = not _groups_cache["live"]
+        current = {} if first else _groups_cache["data"] or {}
+        updated, removed = {}, []
+        for change in changes:
+            group_id = int(change.document.id)
+            if change.type.name == "REMOVED":
+                _registered_groups.discard(group_id)
+                _saved_group_names.pop(group_id, None)
+                if group_id in current:
+                    removed.append(group_id)
+                continue
+            
+            data = change.document.to_dict()
+            _registered_groups.add(group_id)
+            if first or current.get(group_id, {}).get("group_name") != data.get("group_name"):
+                updated[group_id] = data
+        
+        # Counter updates touch group documents on every join; only name
+        # changes need a new dict and a rebuilt group menu
+        if updated or removed:
+            groups = {**current, **updated}
+            for group_id in removed:
+                del groups[group_id]
+            _groups_cache["data"] = groups
+            _groups_version += 1
+        elif first:
+            _groups_cache["data"] = {}
+        _groups_cache.update(ts=time.monotonic(), live=True)
+    _groups_loaded.set()
+
+
+def watch_groups():
+    """Load all groups and keep the groups cache in sync with Firestore"""
+    watch = db.collection("groups").select(["group_name"]).on_snapshot(_on_groups_snapshot)
+    _groups_cache["watch"] = watch
+    return watch
+
+
+def get_group_from_db(group_id: int) -> dict:
+    """Retrieve a single group's name from Firestore"""
     try:
-        docs = db.collection("groups").stream()
-        return {int(doc.id): doc.to_dict() for doc in docs}
+        snapshot = db.collection("groups").document(str(group_id)).get(field_paths=["group_name"])
+        return snapshot.to_dict() or {}
     except Exception as e:
-        logger.error(f"Error fetching groups: {e}")
+        logger.error("Error fetching group %s: %s", group_id, e)
         return {}
 
 
-def save_inviter_stats_to_db(group_id: int, user_id: int, count: int, user_name: str = None) -> None:
-    """Save inviter statistics to Firestore"""
+def count_docs(query) -> int:
+    """Count the documents matching a query with a server-side aggregation"""
+    return query.count().get()[0][0].value
+
+
+def backfill_join_counters(group_id: int) -> dict:
+    """Rebuild a group's join counters from its member_joins log and store them"""
+    group_ref = db.collection("groups").document(str(group_id))
+    joins_ref = group_ref.collection("member_joins")
+    invited_ref = joins_ref.where("is_invited", "==", True)
+    
+    # Only the buckets read by get_group_statistics are rebuilt
+    today = datetime.utcnow().date()
+    daily_joins = {}
+    daily_invited = {}
+    for i in range(7):
+        day = today - timedelta(days=i)
+        start = datetime(day.year, day.month, day.day)
+        end = start + timedelta(days=1)
+        joined = count_docs(joins_ref.where("joined_at", ">=", start).where("joined_at", "<", end))
+        if joined:
+            daily_joins[day.isoformat()] = joined
+            invited = count_docs(invited_ref.where("joined_at", ">=", start).where("joined_at", "<", end))
+            if invited:
+                daily_invited[day.isoformat()] = invited
+    
+    counters = {
+        "total_members": count_docs(joins_ref),
+        "total_invited": count_docs(invited_ref),
+        "daily_joins": daily_joins,
+        "daily_invited": daily_invited,
+        "join_counters": True,
+    }
+    group_ref.set(counters, merge=True)
+    logger.info("Join counters backfilled: Group %s, %s join(s)", group_id, counters['total_members'])
+    return counters
+
+
+def get_user_inviter_stats(user_id: int) -> dict:
+    """Retrieve a user's inviter statistics across all groups with one collection group query"""
     try:
-        ref = db.collection("groups").document(str(group_id)).collection("inviters").document(str(user_id))
-        data = {
-            "user_id": user_id,
-            "invite_count": count,
-            "last_updated": datetime.utcnow()
-        }
-        if user_name:
-            data["user_name"] = user_name
-        ref.set(data, merge=True)
-        logger.info(f"Inviter stats saved: Group {group_id}, User {user_id}, Count {count}")
+        docs = (
+            db.collection_group("inviters")
+            .where("user_id", "==", user_id)
+            .select(["invite_count"])
+            .stream()
+        )
+        return {int(doc.reference.parent.parent.id): doc.to_dict() for doc in docs}
     except Exception as e:
-        logger.error(f"Error saving inviter stats: {e}")
+        logger.error("Error fetching inviter stats for user %s: %s", user_id, e)
+        return {}
 
 
-def log_member_join(group_id: int, user_id: int, invited_by: int = None) -> None:
-    """Log each member join event with timestamp"""
+def get_top_inviters(group_id: int, limit: int = 10) -> list:
+    """Retrieve the top inviters of a group, ordered by invite count on the server"""
+    version = _inviters_versions.get(group_id, 0)
+    cached = _top_inviters_cache.get((group_id, limit))
+    if cached and cached[0] == version:
+        return cached[1]
+    
     try:
-        ref = db.collection("groups").document(str(group_id)).collection("member_joins").document()
-        ref.set({
-            "user_id": user_id,
-            "invited_by": invited_by,
-            "joined_at": datetime.utcnow(),
-            "is_invited": invited_by is not None
-        })
-        logger.info(f"Member join logged: Group {group_id}, User {user_id}, Invited by {invited_by}")
+        query = (
+            db.collection("groups").document(str(group_id)).collection("inviters")
+            .select(["invite_count", "user_name"])
+            .order_by("invite_count", direction=firestore.Query.DESCENDING)
+            .limit(limit)
+        )
+        top_inviters = [(int(doc.id), doc.to_dict()) for doc in query.stream()]
+        # Tagged with the version read before the query, so a write racing
+        # with it leaves the entry stale instead of caching old counts
+        _top_inviters_cache[(group_id, limit)] = (version, top_inviters)
+        return top_inviters
     except Exception as e:
-        logger.error(f"Error logging member join: {e}")
+        logger.error("Error fetching top inviters for group %s: %s", group_id, e)
+        return []
 
 
-def get_inviter_stats_from_db(group_id: int) -> dict:
-    """Retrieve inviter statistics for a group from Firestore"""
+def backfill_inviter_counters(group_id: int) -> dict:
+    """Rebuild a group's active inviter counter from its inviters and store it"""
+    group_ref = db.collection("groups").document(str(group_id))
+    active_inviters = sum(
+        1 for doc in group_ref.collection("inviters").stream()
+        if doc.to_dict().get("invite_count", 0) > 0
+    )
+    
+    counters = {"active_inviters": active_inviters, "inviter_counters": True}
+    group_ref.set(counters, merge=True)
+    logger.info("Inviter counters backfilled: Group %s, %s inviter(s)", group_id, active_inviters)
+    return counters
+
+
+def prune_daily_counters(group_id: int, group: dict, oldest_day: str) -> None:
+    """Delete per-day join buckets older than oldest_day from a group document"""
+    stale = {
+        field: {day: firestore.DELETE_FIELD for day in group.get(field, {}) if day < oldest_day}
+        for field in ("daily_joins", "daily_invited")
+    }
+    stale = {field: days for field, days in stale.items() if days}
+    if not stale:
+        return
+    
     try:
-        docs = db.collection("groups").document(str(group_id)).collection("inviters").stream()
-        return {int(doc.id): doc.to_dict() for doc in docs}
+        db.collection("groups").document(str(group_id)).set(stale, merge=True)
     except Exception as e:
-        logger.error(f"Error fetching inviter stats for group {group_id}: {e}")
-        return {}
+        logger.error("Error pruning daily counters for group %s: %s", group_id, e)
 
 
 def get_group_statistics(group_id: int) -> dict:
-    """Get comprehensive statistics for a group"""
+    """Get comprehensive statistics for a group from its join counters"""
     try:
-        now = datetime.utcnow()
-        seven_days_ago = now - timedelta(days=7)
-        
-        # Get all member joins
-        joins_ref = db.collection("groups").document(str(group_id)).collection("member_joins")
-        all_joins = list(joins_ref.stream())
+        snapshot = db.collection("groups").document(str(group_id)).get()
+        group = snapshot.to_dict() or {}
         
-        # Calculate statistics
-        total_members = len(all_joins)
-        total_invited = sum(1 for doc in all_joins if doc.to_dict().get("is_invited", False))
+        # Groups registered before counters existed are backfilled once
+        if snapshot.exists and not group.get("join_counters"):
+            group.update(backfill_join_counters(group_id))
+        if snapshot.exists and not group.get("inviter_counters"):
+            group.update(backfill_inviter_counters(group_id))
         
-        # Last 7 days stats
-        recent_joins = [doc for doc in all_joins if doc.to_dict().get("joined_at", datetime.min) >= seven_days_ago]
-        joined_last_7 = len(recent_joins)
-        invited_last_7 = sum(1 for doc in recent_joins if doc.to_dict().get("is_invited", False))
+        # Last 7 days stats, summed from per-day buckets
+        today = datetime.utcnow().date()
+        last_7_days = [(today - timedelta(days=i)).isoformat() for i in range(7)]
+        daily_joins = group.get("daily_joins", {})
+        daily_invited = group.get("daily_invited", {})
+        joined_last_7 = sum(daily_joins.get(day, 0) for day in last_7_days)
+        invited_last_7 = sum(daily_invited.get(day, 0) for day in last_7_days)
         
-        # Active inviters (invited at least 1 person)
-        inviter_stats = get_inviter_stats_from_db(group_id)
-        active_inviters = len([uid for uid, data in inviter_stats.items() if data.get("invite_count", 0) > 0])
+        # Buckets only ever need to cover the last 7 days
+        prune_daily_counters(group_id, group, last_7_days[-1])
         
         return {
-            "total_members": total_members,
-            "total_invited": total_invited,
+            "total_members": group.get("total_members", 0),
+            "total_invited": group.get("total_invited", 0),
             "joined_last_7": joined_last_7,
             "invited_last_7": invited_last_7,
-            "active_inviters": active_inviters
+            "active_inviters": group.get("active_inviters", 0)
         }
     except Exception as e:
-        logger.error(f"Error getting group statistics: {e}")
+        logger.error("Error getting group statistics: %s", e)
         return {
             "total_members": 0,
             "total_invited": 0,
@@ -165,57 +377,412 @@ def get_group_statistics(group_id: int) -> dict:
         }
 
 
-def increment_inviter_count(group_id: int, user_id: int, user_name: str = None) -> int:
-    """Atomically increment inviter count in Firestore and return new count"""
-    try:
+def get_inviter_count(group_id: int, user_id: int) -> int:
+    """Retrieve a user's invite count in a group from Firestore"""
+    ref = db.collection("groups").document(str(group_id)).collection("inviters").document(str(user_id))
+    snapshot = ref.get(field_paths=["invite_count"])
+    return snapshot.get("invite_count") if snapshot.exists else 0
+
+
+# -------------------------------
+# ⏱️ Write Buffer
+# -------------------------------
+DB_WORKERS = 32
+FLUSH_INTERVAL = 0.5  # seconds
+MAX_BATCH_WRITES = 500  # Firestore limit per batch
+GROUP_TOUCH_INTERVAL = 10  # seconds between last_updated writes per group
+
+_dirty_groups: dict = {}  # group_id -> {counter: increment}, daily counters map day -> increment
+_group_touched: dict = {}  # group_id -> monotonic time last_updated was last written
+_deferred_touches: set = set()  # group ids with a last_updated write scheduled for later
+_pending_invites: dict = {}  # (group_id, user_id) -> {"amount": n, "user_name": name}
+_pending_names: dict = {}  # (group_id, user_id) -> user_name resolved from Telegram
+_invite_counts: dict = {}  # (group_id, user_id) -> invite count including pending invites
+_pending_joins: list = []  # (member_joins ref, join data) to add on the next flush
+_flush_event = asyncio.Event()
+
+
+def _add_counters(target: dict, counters: dict) -> None:
+    """Add counter increments, including per-day ones, into target"""
+    for field, value in counters.items():
+        if isinstance(value, dict):
+            _add_counters(target.setdefault(field, {}), value)
+        else:
+            target[field] = target.get(field, 0) + value
+
+
+def mark_group_dirty(group_id: int, counters: dict = None) -> None:
+    """Schedule a last_updated bump and counter increments for a group's next write"""
+    _add_counters(_dirty_groups.setdefault(group_id, {}), counters or {})
+    _flush_event.set()
+
+
+def _touch_group(group_id: int) -> None:
+    """Queue a deferred last_updated write for a group"""
+    _deferred_touches.discard(group_id)
+    mark_group_dirty(group_id)
+
+
+async def record_invites(group_id: int, user_id: int, user_name: str = None, amount: int = 1, username: str = None) -> int:
+    """Buffer an inviter's increment for the next flush and return their new count"""
+    key = (group_id, user_id)
+    if key not in _invite_counts:
+        count = await asyncio.to_thread(get_inviter_count, group_id, user_id)
+        _invite_counts.setdefault(key, count)
+    is_new_inviter = _invite_counts[key] == 0
+    _invite_counts[key] += amount
+    
+    pending = _pending_invites.setdefault(key, {"amount": 0})
+    pending["amount"] += amount
+    if user_name:
+        pending["user_name"] = user_name
+    if username:
+        pending["username"] = username
+    
+    mark_group_dirty(group_id, {"active_inviters": 1} if is_new_inviter else None)
+    return _invite_counts[key]
+
+
+def record_joins(group_id: int, joins: list) -> None:
+    """Buffer a batch of (user_id, invited_by) member joins and the group's join counters"""
+    now = datetime.utcnow()
+    day = now.date().isoformat()
+    joins_ref = db.collection("groups").document(str(group_id)).collection("member_joins")
+    for user_id, invited_by in joins:
+        _pending_joins.append((joins_ref.document(), {
+            "user_id": user_id,
+            "invited_by": invited_by,
+            "joined_at": now,
+            "is_invited": invited_by is not None
+        }))
+    
+    counters = {"total_members": len(joins), "daily_joins": {day: len(joins)}}
+    invited = sum(1 for _, invited_by in joins if invited_by is not None)
+    if invited:
+        counters.update(total_invited=invited, daily_invited={day: invited})
+    mark_group_dirty(group_id, counters)
+
+
+def record_inviter_name(group_id: int, user_id: int, user_name: str) -> None:
+    """Buffer a resolved name for an inviter document that lacks one"""
+    _pending_names[(group_id, user_id)] = user_name
+    _flush_event.set()
+
+
+def commit_writes(writes: list) -> None:
+    """Commit (ref, data) merge-sets in a single batch"""
+    batch = db.batch()
+    for ref, data in writes:
+        batch.set(ref, data, merge=True)
+    batch.commit()
+
+
+def _counter_increments(counters: dict) -> dict:
+    """Turn buffered counter increments into Firestore Increment transforms"""
+    return {
+        field: _counter_increments(value) if isinstance(value, dict) else firestore.Increment(value)
+        for field, value in counters.items()
+    }
+
+
+async def flush_pending_writes(force: bool = False) -> None:
+    """Flush buffered group updates, joins and invite increments off the event loop"""
+    if not _dirty_groups and not _pending_invites and not _pending_names and not _pending_joins:
+        return
+    
+    # Drained synchronously on the event loop, so concurrent flushes never
+    # commit the same increment twice
+    now = time.monotonic()
+    groups = {}
+    for group_id in list(_dirty_groups):
+        # A busy group's document is only written every GROUP_TOUCH_INTERVAL,
+        # with every counter increment buffered since the last write
+        touched = _group_touched.get(group_id)
+        if force or touched is None or now - touched >= GROUP_TOUCH_INTERVAL:
+            groups[group_id] = _dirty_groups.pop(group_id)
+        elif group_id not in _deferred_touches:
+            # Held back groups are written once the interval is over
+            _deferred_touches.add(group_id)
+            asyncio.get_running_loop().call_later(
+                touched + GROUP_TOUCH_INTERVAL - now, _touch_group, group_id
+            )
+    invites = dict(_pending_invites)
+    names = dict(_pending_names)
+    joins = list(_pending_joins)
+    _pending_invites.clear()
+    _pending_names.clear()
+    _pending_joins.clear()
+    
+    writes = []
+    for group_id, counters in groups.items():
+        data = {"last_updated": firestore.SERVER_TIMESTAMP, **_counter_increments(counters)}
+        writes.append((("group", group_id), db.collection("groups").document(str(group_id)), data))
+    for i, (ref, data) in enumerate(joins):
+        writes.append((("join", i), ref, data))
+    for (group_id, user_id), pending in invites.items():
+        data = {
+            "user_id": user_id,
+            "invite_count": firestore.Increment(pending["amount"]),
+            "last_updated": firestore.SERVER_TIMESTAMP
+        }
+        if pending.get("user_name"):
+            data["user_name"] = pending["user_name"]
+            data["name_updated_at"] = firestore.SERVER_TIMESTAMP
+        if pending.get("username"):
+            data["username"] = pending["username"]
         ref = db.collection("groups").document(str(group_id)).collection("inviters").document(str(user_id))
+        writes.append((("invite", (group_id, user_id)), ref, data))
+    for (group_id, user_id), user_name in names.items():
+        ref = db.collection("groups").document(str(group_id)).collection("inviters").document(str(user_id))
+        writes.append((("name", (group_id, user_id)), ref, {"user_name": user_name}))
+    
+    for start in range(0, len(writes), MAX_BATCH_WRITES):
+        chunk = writes[start:start + MAX_BATCH_WRITES]
+        # Shielded so a cancelled flush can still learn whether the batch,
+        # which keeps running in its thread, was committed
+        commit = asyncio.ensure_future(
+            asyncio.to_thread(commit_writes, [(ref, data) for _, ref, data in chunk])
+        )
+        try:
+            await asyncio.shield(commit)
+        except asyncio.CancelledError:
+            await asyncio.wait([commit])
+            committed = commit.exception() is None
+            if committed:
+                _writes_committed(chunk, now)
+            _requeue_writes(writes[start + len(chunk) if committed else start:], groups, invites, names, joins)
+            raise
+        except Exception as e:
+            logger.error("Error flushing pending writes: %s", e)
+            _requeue_writes(writes[start:], groups, invites, names, joins)
+            _flush_event.set()
+            return
         
-        # Use transaction for atomic increment
-        @firestore.transactional
-        def update_in_transaction(transaction, doc_ref):
-            snapshot = doc_ref.get(transaction=transaction)
-            new_count = snapshot.get("invite_count") + 1 if snapshot.exists else 1
-            
-            data = {
-                "user_id": user_id,
-                "invite_count": new_count,
-                "last_updated": datetime.utcnow()
-            }
-            if user_name:
-                data["user_name"] = user_name
-            
-            transaction.set(doc_ref, data, merge=True)
-            return new_count
-        
-        transaction = db.transaction()
-        new_count = update_in_transaction(transaction, ref)
-        
-        # Also update group's last activity
-        db.collection("groups").document(str(group_id)).update({"last_updated": datetime.utcnow()})
+        _writes_committed(chunk, now)
+
+
+def _writes_committed(chunk: list, now: float) -> None:
+    """Update the write buffer's bookkeeping after a batch is committed"""
+    for (kind, key), _, data in chunk:
+        if kind == "group":
+            _group_touched[key] = now
+            continue
+        if kind == "join":
+            continue
         
-        return new_count
-    except Exception as e:
-        logger.error(f"Error incrementing inviter count: {e}")
-        return 0
+        bump_inviters_version(key[0])
+        # Firestore now holds the count, so it is read again on the next
+        # invite unless more invites were buffered meanwhile
+        if kind == "invite" and key not in _pending_invites:
+            _invite_counts.pop(key, None)
+
+
+def _requeue_writes(writes: list, groups: dict, invites: dict, names: dict, joins: list) -> None:
+    """Put writes that were not committed back into the write buffer"""
+    for (kind, key), _, _ in writes:
+        if kind == "group":
+            _add_counters(_dirty_groups.setdefault(key, {}), groups[key])
+        elif kind == "join":
+            _pending_joins.append(joins[key])
+        elif kind == "name":
+            _pending_names.setdefault(key, names[key])
+        else:
+            pending = _pending_invites.setdefault(key, {"amount": 0})
+            pending["amount"] += invites[key]["amount"]
+            for field in ("user_name", "username"):
+                if invites[key].get(field):
+                    pending.setdefault(field, invites[key][field])
+
+
+async def write_buffer_flusher() -> None:
+    """Coalesce buffered writes into batched commits at most every FLUSH_INTERVAL"""
+    while True:
+        await _flush_event.wait()
+        await asyncio.sleep(FLUSH_INTERVAL)
+        _flush_event.clear()
+        try:
+            await flush_pending_writes()
+        except Exception:
+            logger.exception("Error in the write buffer flusher")
+
+
+# -------------------------------
+# 👤 Name Resolution
+# -------------------------------
+NAME_CACHE_TTL = 3600  # seconds
+NAME_CACHE_SIZE = 10_000
+
+_name_cache: OrderedDict = OrderedDict()  # user_id -> (expires_at, name), in LRU order
+_name_inflight: dict = {}  # user_id -> asyncio.Task
+
+
+def cache_name(user_id: int, name: str) -> None:
+    """Store a resolved name, evicting the least recently used entry when full"""
+    _name_cache[user_id] = (time.monotonic() + NAME_CACHE_TTL, name)
+    _name_cache.move_to_end(user_id)
+    if len(_name_cache) > NAME_CACHE_SIZE:
+        _name_cache.popitem(last=False)
+
+
+async def _fetch_name(bot, user_id: int) -> str:
+    """Fetch a user's full name from Telegram and cache it"""
+    user = await bot.get_chat(user_id)
+    cache_name(user_id, user.full_name)
+    return user.full_name
+
+
+async def resolve_name(bot, user_id: int):
+    """Resolve a user's full name or None, sharing one get_chat call between concurrent callers"""
+    cached = _name_cache.get(user_id)
+    if cached and cached[0] > time.monotonic():
+        _name_cache.move_to_end(user_id)
+        return cached[1]
+    
+    task = _name_inflight.get(user_id)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_name(bot, user_id))
+        _name_inflight[user_id] = task
+        task.add_done_callback(lambda _, uid=user_id: _name_inflight.pop(uid, None))
+    
+    try:
+        return await asyncio.shield(task)
+    except Exception:
+        return None
+
+
+async def resolve_names(bot, user_ids: list) -> dict:
+    """Resolve several users' full names concurrently"""
+    names = await asyncio.gather(*(resolve_name(bot, user_id) for user_id in user_ids))
+    return dict(zip(user_ids, names))
+
+
+# -------------------------------
+# 🛡️ Admin Checks
+# -------------------------------
+ADMIN_CACHE_TTL = 60  # chat member updates only reach the bot where it is an admin
+ADMIN_STATUSES = ("administrator", "creator")
+_admins_cache: dict = {}  # chat_id -> (expires_at, admin user ids)
+
+
+async def get_admin_ids(bot, chat_id: int) -> set:
+    """Return the ids of a chat's administrators, cached for ADMIN_CACHE_TTL seconds"""
+    cached = _admins_cache.get(chat_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    
+    admins = await bot.get_chat_administrators(chat_id)
+    admin_ids = {admin.user.id for admin in admins}
+    _admins_cache[chat_id] = (time.monotonic() + ADMIN_CACHE_TTL, admin_ids)
+    return admin_ids
+
+
+# -------------------------------
+# 🏅 Formatting
+# -------------------------------
+RANK_PREFIXES = ("🥇", "🥈", "🥉") + tuple(f"{i}." for i in range(4, 11))
+
+
+# -------------------------------
+# ⌨️ Keyboards
+# -------------------------------
+@lru_cache(maxsize=1024)
+def button(text: str, callback_data: str) -> InlineKeyboardButton:
+    """Return a shared button for a (text, callback_data) pair"""
+    return InlineKeyboardButton(text, callback_data=callback_data)
+
+
+CLOSE_MARKUP = InlineKeyboardMarkup([[button("« Close", "close")]])
+
+_leaderboard_markups: dict = {}  # chat_id -> InlineKeyboardMarkup
+
+
+def leaderboard_markup(chat_id: int) -> InlineKeyboardMarkup:
+    """Return the cached "View Leaderboard" keyboard for a group"""
+    markup = _leaderboard_markups.get(chat_id)
+    if markup is None:
+        markup = InlineKeyboardMarkup(
+            [[button("🏆 View Leaderboard", f"leaderboard_{chat_id}")]]
+        )
+        _leaderboard_markups[chat_id] = markup
+    return markup
+
+
+_group_menu_cache = (-1, None)  # (groups version, InlineKeyboardMarkup)
+
+
+def build_group_menu(groups: dict, version: int) -> InlineKeyboardMarkup:
+    """Return the group-selection keyboard, rebuilding it only after groups change"""
+    global _group_menu_cache
+    cached_version, markup = _group_menu_cache
+    if markup is None or cached_version != version:
+        markup = InlineKeyboardMarkup([
+            [button(g.get("group_name", str(gid)), f"leaderboard_{gid}")]
+            for gid, g in groups.items()
+        ])
+        _group_menu_cache = (version, markup)
+    return markup
+
+
+# -------------------------------
+# 🏆 Leaderboard Rendering
+# -------------------------------
+NO_INVITES_TEXT = "📊 No invites yet. Be the first to invite friends!"
+
+_leaderboard_text_cache: dict = {}  # chat_id -> (inviters version, title, text)
+
+
+async def render_leaderboard(bot, chat_id: int, title: str):
+    """Render a group's top inviters as Markdown, or None if nobody has invited yet"""
+    version = _inviters_versions.get(chat_id, 0)
+    cached = _leaderboard_text_cache.get(chat_id)
+    if cached and cached[:2] == (version, title):
+        return cached[2]
+    
+    sorted_inviters = await asyncio.to_thread(get_top_inviters, chat_id)
+    if not sorted_inviters:
+        return None
+    
+    # Fetch names missing from stored data from Telegram in one go, and
+    # store them so later renders don't need to
+    missing = [user_id for user_id, data in sorted_inviters if not data.get("user_name")]
+    resolved = await resolve_names(bot, missing)
+    for user_id, name in resolved.items():
+        if name:
+            record_inviter_name(chat_id, user_id, name)
+    
+    lines = [f"🏆 *Top Inviters - {title}* 🏆", ""]
+    for i, (user_id, data) in enumerate(sorted_inviters):
+        count = data.get("invite_count", 0)
+        name = data.get("user_name") or resolved.get(user_id) or user_id
+        lines.append(f"{RANK_PREFIXES[i]} {name}: *{count}* invite(s)")
+    
+    leaderboard_text = "\n".join(lines)
+    
+    # Only cache complete renders, so failed name lookups are retried
+    if all(resolved.values()):
+        _leaderboard_text_cache[chat_id] = (version, title, leaderboard_text)
+    return leaderboard_text
 
 
 # -------------------------------
 # 🤖 Bot Command Handlers
 # -------------------------------
+WELCOME_TEXT = (
+    "👋 *Welcome to the Inviter Tracking Bot\\!*\n\n"
+    "I help track who invites members to groups and maintain leaderboards\\.\n\n"
+    "*Available Commands:*\n"
+    "• /start \\- Show this message\n"
+    "• /register\\_group \\- Register this group \\(Group admins only\\)\n"
+    # "• /leaderboard \\- View top inviters\n"
+    # "• /mystats \\- View your invite statistics\n"
+    # "• /groupstats \\- View group statistics\n\n"
+    "\n**Just add me to your group and make me an admin**\\! 🚀"
+)
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle /start command"""
-    welcome_text = (
-        "👋 *Welcome to the Inviter Tracking Bot\\!*\n\n"
-        "I help track who invites members to groups and maintain leaderboards\\.\n\n"
-        "*Available Commands:*\n"
-        "• /start \\- Show this message\n"
-        "• /register\\_group \\- Register this group \\(Group admins only\\)\n"
-        # "• /leaderboard \\- View top inviters\n"
-        # "• /mystats \\- View your invite statistics\n"
-        # "• /groupstats \\- View group statistics\n\n"
-        "\n**Just add me to your group and make me an admin**\\! 🚀"
-    )
-    await update.message.reply_text(welcome_text, parse_mode="MarkdownV2")
+    await update.message.reply_text(WELCOME_TEXT, parse_mode="MarkdownV2")
 
 
 async def register_group(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -228,12 +795,12 @@ async def register_group(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     
     # Check if user is admin
     try:
-        member = await context.bot.get_chat_member(chat.id, update.effective_user.id)
-        if member.status not in ["creator", "administrator"]:
+        admin_ids = await get_admin_ids(context.bot, chat.id)
+        if update.effective_user.id not in admin_ids:
             await update.message.reply_text("❌ Only group administrators can register the group.")
             return
     except Exception as e:
-        logger.error(f"Error checking admin status: {e}")
+        logger.error("Error checking admin status: %s", e)
         await update.message.reply_text("❌ Error checking permissions.")
         return
     
@@ -241,7 +808,7 @@ async def register_group(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     group_name = chat.title
     
     try:
-        save_group_to_db(group_id, group_name)
+        await asyncio.to_thread(save_group_to_db, group_id, group_name)
         await update.message.reply_text(
             f"✅ *Group Registered Successfully!*\n\n"
             f"📊 Group: {group_name}\n"
@@ -250,62 +817,106 @@ async def register_group(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             parse_mode="Markdown"
         )
     except Exception as e:
-        logger.error(f"Error registering group: {e}")
+        logger.error("Error registering group: %s", e)
         await update.message.reply_text("❌ Error registering group. Please try again.")
 
 
+async def handle_bot_membership(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Register a group as soon as the bot is added to it"""
+    change = update.my_chat_member
+    chat = change.chat
+    
+    if chat.type not in ["group", "supergroup"]:
+        return
+    
+    # The admin list may have changed along with the bot's own rights
+    _admins_cache.pop(chat.id, None)
+    
+    if change.new_chat_member.status in ["member", "administrator"]:
+        try:
+            await asyncio.to_thread(save_group_to_db, chat.id, chat.title)
+        except Exception as e:
+            logger.error("Error registering group on bot join: %s", e)
+
+
+async def handle_admin_change(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Drop a chat's cached admins when a member is promoted or demoted"""
+    change = update.chat_member
+    if change.old_chat_member.status in ADMIN_STATUSES or change.new_chat_member.status in ADMIN_STATUSES:
+        _admins_cache.pop(change.chat.id, None)
+
+
 async def handle_new_members(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Handle new members joining the group"""
+    """Handle new members joining the group, replying once per batch"""
     message = update.message
     chat_id = message.chat_id
     new_members = message.new_chat_members
     
-    # Ensure group is registered
-    groups = get_all_groups_from_db()
-    if chat_id not in groups:
-        save_group_to_db(chat_id, message.chat.title)
+    # Ensure group is registered (groups the bot joined before it tracked
+    # its own membership are not registered by handle_bot_membership)
+    if chat_id not in _registered_groups:
+        await asyncio.to_thread(ensure_group_registered, chat_id, message.chat.title)
+    
+    inviter_id = message.from_user.id
+    inviter_name = message.from_user.first_name
+    added_names = []
+    joined_names = []
+    joins = []
+    
+    # Names seen here save get_chat lookups when rendering leaderboards
+    cache_name(inviter_id, message.from_user.full_name)
     
     for member in new_members:
         # Skip if bot itself was added
         if member.is_bot:
             continue
         
+        cache_name(member.id, member.full_name)
+        
         # Check if user was added by someone or joined via link
-        if message.from_user.id != member.id:
-            # User was added by another user
-            inviter_id = message.from_user.id
-            inviter_name = message.from_user.first_name
-            
-            try:
-                new_count = increment_inviter_count(chat_id, inviter_id, inviter_name)
-                log_member_join(chat_id, member.id, invited_by=inviter_id)
-                
-                keyboard = [[InlineKeyboardButton("🏆 View Leaderboard", callback_data=f"leaderboard_{chat_id}")]]
-                reply_markup = InlineKeyboardMarkup(keyboard)
-                
-                await message.reply_text(
-                    f"🎉 *Thank you {inviter_name} for adding {member.first_name}!*\n\n"
-                    f"📊 You've invited *{new_count}* member(s) to the group.\n"
-                    f"Keep inviting friends! 🚀",
-                    reply_markup=reply_markup,
-                    parse_mode="Markdown"
-                )
-            except Exception as e:
-                logger.error(f"Error handling new member: {e}")
+        if inviter_id != member.id:
+            joins.append((member.id, inviter_id))
+            added_names.append(member.first_name)
         else:
-            # User joined via link
-            log_member_join(chat_id, member.id, invited_by=None)
-            
-            keyboard = [[InlineKeyboardButton("🏆 View Leaderboard", callback_data=f"leaderboard_{chat_id}")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
+            joins.append((member.id, None))
+            joined_names.append(member.first_name)
+    
+    # Logged by the background flusher, with one counter write per group
+    # every GROUP_TOUCH_INTERVAL
+    if joins:
+        record_joins(chat_id, joins)
+    
+    if added_names:
+        # Users were added by another user: one increment and one thank-you for the batch
+        try:
+            # Buffered and written in a batch by the background flusher
+            new_count = await record_invites(
+                chat_id,
+                inviter_id,
+                message.from_user.full_name,
+                len(added_names),
+                username=message.from_user.username,
+            )
             
             await message.reply_text(
-                f"👋 *Welcome {member.first_name}!*\n\n"
-                f"📢 Help us grow this community by inviting your friends!\n"
-                f"✨ Add members and compete on the leaderboard!",
-                # reply_markup=reply_markup,
+                f"🎉 *Thank you {inviter_name} for adding {', '.join(added_names)}!*\n\n"
+                f"📊 You've invited *{new_count}* member(s) to the group.\n"
+                f"Keep inviting friends! 🚀",
+                reply_markup=leaderboard_markup(chat_id),
                 parse_mode="Markdown"
             )
+        except Exception as e:
+            logger.error("Error handling new members: %s", e)
+    
+    if joined_names:
+        # Users joined via link
+        await message.reply_text(
+            f"👋 *Welcome {', '.join(joined_names)}!*\n\n"
+            f"📢 Help us grow this community by inviting your friends!\n"
+            f"✨ Add members and compete on the leaderboard!",
+            # reply_markup=leaderboard_markup(chat_id),
+            parse_mode="Markdown"
+        )
 
 
 async def show_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -314,53 +925,25 @@ async def show_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     await query.answer()
     
     try:
-        chat_id = int(query.data.split('_')[1])
+        chat_id = int(context.matches[0].group(1))
         
-        inviter_stats = get_inviter_stats_from_db(chat_id)
+        # Get group name, from the groups cache when it has the group
+        groups = await asyncio.to_thread(get_all_groups_from_db)
+        group = groups.get(chat_id) or await asyncio.to_thread(get_group_from_db, chat_id)
+        group_name = group.get("group_name", "Unknown Group")
         
-        if not inviter_stats:
-            await query.edit_message_text("📊 No invites yet. Be the first to invite friends!")
+        leaderboard_text = await render_leaderboard(context.bot, chat_id, group_name)
+        if not leaderboard_text:
+            await query.edit_message_text(NO_INVITES_TEXT)
             return
         
-        # Sort by invite count
-        sorted_inviters = sorted(
-            inviter_stats.items(),
-            key=lambda x: x[1].get("invite_count", 0),
-            reverse=True
-        )[:10]
-        
-        # Get group name
-        groups = get_all_groups_from_db()
-        group_name = groups.get(chat_id, {}).get("group_name", "Unknown Group")
-        
-        leaderboard_text = f"🏆 *Top Inviters - {group_name}* 🏆\n\n"
-        medals = ["🥇", "🥈", "🥉"]
-        
-        for i, (user_id, data) in enumerate(sorted_inviters):
-            count = data.get("invite_count", 0)
-            
-            # Try to get user name from stored data or fetch from Telegram
-            name = data.get("user_name")
-            if not name:
-                try:
-                    user = await context.bot.get_chat(user_id)
-                    name = user.first_name
-                except:
-                    name = user_id
-            
-            medal = medals[i] if i < 3 else f"{i+1}."
-            leaderboard_text += f"{medal} {name}: *{count}* invite(s)\n"
-        
-        keyboard = [[InlineKeyboardButton("« Close", callback_data="close")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         await query.edit_message_text(
             leaderboard_text,
-            reply_markup=reply_markup,
+            reply_markup=CLOSE_MARKUP,
             parse_mode="Markdown"
         )
     except Exception as e:
-        logger.error(f"Error showing leaderboard: {e}")
+        logger.error("Error showing leaderboard: %s", e)
         await query.edit_message_text("⚠️ Error loading leaderboard. Please try again.")
 
 
@@ -370,73 +953,55 @@ async def leaderboard_command(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     if chat.type in ["group", "supergroup"]:
         # In group, show that group's leaderboard
-        chat_id = chat.id
-        inviter_stats = get_inviter_stats_from_db(chat_id)
-        
-        if not inviter_stats:
-            await update.message.reply_text("📊 No invites yet. Be the first to invite friends!")
+        leaderboard_text = await render_leaderboard(context.bot, chat.id, chat.title)
+        if not leaderboard_text:
+            await update.message.reply_text(NO_INVITES_TEXT)
             return
         
-        sorted_inviters = sorted(
-            inviter_stats.items(),
-            key=lambda x: x[1].get("invite_count", 0),
-            reverse=True
-        )[:10]
-        
-        leaderboard_text = f"🏆 *Top Inviters - {chat.title}* 🏆\n\n"
-        medals = ["🥇", "🥈", "🥉"]
-        
-        for i, (user_id, data) in enumerate(sorted_inviters):
-            count = data.get("invite_count", 0)
-            name = data.get("user_name", user_id)
-            
-            medal = medals[i] if i < 3 else f"{i+1}."
-            leaderboard_text += f"{medal} {name}: *{count}* invite(s)\n"
-        
         await update.message.reply_text(leaderboard_text, parse_mode="Markdown")
     else:
-        # In private chat, show list of groups
-        groups = get_all_groups_from_db()
+        # In private chat, show list of groups. The version is read before
+        # the fetch, so a change racing with it leaves the menu stale
+        # instead of caching old groups under the new version
+        version = _groups_version
+        groups = await asyncio.to_thread(get_all_groups_from_db)
         
         if not groups:
             await update.message.reply_text("📊 No registered groups found.")
             return
         
-        buttons = [
-            [InlineKeyboardButton(g["group_name"], callback_data=f"leaderboard_{gid}")]
-            for gid, g in groups.items()
-        ]
-        reply_markup = InlineKeyboardMarkup(buttons)
+        reply_markup = build_group_menu(groups, version)
         await update.message.reply_text("Select a group to view leaderboard:", reply_markup=reply_markup)
 
 
 async def my_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Show user's invite statistics across all groups"""
     user_id = update.effective_user.id
-    groups = get_all_groups_from_db()
+    groups = await asyncio.to_thread(get_all_groups_from_db)
     
     if not groups:
         await update.message.reply_text("📊 No groups registered yet.")
         return
     
-    stats_text = f"📊 *Your Invite Statistics*\n\n"
+    lines = ["📊 *Your Invite Statistics*", ""]
     total_invites = 0
     found_stats = False
     
+    user_stats = await asyncio.to_thread(get_user_inviter_stats, user_id)
+    
     for group_id, group_data in groups.items():
-        inviter_stats = get_inviter_stats_from_db(group_id)
-        if user_id in inviter_stats:
-            count = inviter_stats[user_id].get("invite_count", 0)
+        if group_id in user_stats:
+            count = user_stats[group_id].get("invite_count", 0)
             total_invites += count
-            stats_text += f"• {group_data['group_name']}: *{count}* invite(s)\n"
+            lines.append(f"• {group_data.get('group_name', str(group_id))}: *{count}* invite(s)")
             found_stats = True
     
     if not found_stats:
         await update.message.reply_text("📊 You haven't invited anyone yet. Start inviting friends!")
         return
     
-    stats_text += f"\n🎯 *Total Invites: {total_invites}*"
-    await update.message.reply_text(stats_text, parse_mode="Markdown")
+    lines += ["", f"🎯 *Total Invites: {total_invites}*"]
+    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
 
 
 async def group_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -444,22 +1009,25 @@ async def group_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     chat = update.effective_chat
     
     # If in a group, show that group's stats
-    if chat.type in ["private"]:
-        groups = get_all_groups_from_db()
+    if chat.type in ["group", "supergroup"]:
+        groups = await asyncio.to_thread(get_all_groups_from_db)
         if chat.id not in groups:
             await update.message.reply_text("❌ This group is not registered. Use /register_group first.")
             return
         
         group_data = groups[chat.id]
-        stats = get_group_statistics(chat.id)
+        stats = await asyncio.to_thread(get_group_statistics, chat.id)
         
-        stats_text = f"📊 *Group Stats — {group_data['group_name']}*\n\n"
-        stats_text += f"👥 Total Members Joined: *{stats['total_members']}*\n"
-        stats_text += f"➕ Total Invited Members: *{stats['total_invited']}*\n"
-        stats_text += f"📈 Joined in Last 7 Days: *{stats['joined_last_7']}*\n"
-        stats_text += f"🏅 Invited in Last 7 Days: *{stats['invited_last_7']}*\n"
-        stats_text += f"🏆 Active Inviters: *{stats['active_inviters']}*\n"
-        stats_text += f"💬 Messages Monitored: *Coming Soon!*"
+        stats_text = "\n".join([
+            f"📊 *Group Stats — {group_data.get('group_name', str(chat.id))}*",
+            "",
+            f"👥 Total Members Joined: *{stats['total_members']}*",
+            f"➕ Total Invited Members: *{stats['total_invited']}*",
+            f"📈 Joined in Last 7 Days: *{stats['joined_last_7']}*",
+            f"🏅 Invited in Last 7 Days: *{stats['invited_last_7']}*",
+            f"🏆 Active Inviters: *{stats['active_inviters']}*",
+            "💬 Messages Monitored: *Coming Soon!*",
+        ])
         
         await update.message.reply_text(stats_text, parse_mode="Markdown")
         return
@@ -469,24 +1037,31 @@ async def group_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         await update.message.reply_text("❌ This command works in groups or private messages.")
         return
     
-    groups = get_all_groups_from_db()
+    groups = await asyncio.to_thread(get_all_groups_from_db)
     
     if not groups:
         await update.message.reply_text("📊 No registered groups found.")
         return
     
-    stats_text = "📈 *Bot Group Statistics*\n\n"
+    lines = ["📈 *Bot Group Statistics*", ""]
     
-    for group_id, group_data in groups.items():
-        group_name = group_data["group_name"]
-        stats = get_group_statistics(group_id)
+    # Fetch every group's statistics concurrently
+    all_stats = await asyncio.gather(
+        *(asyncio.to_thread(get_group_statistics, group_id) for group_id in groups)
+    )
+    
+    for (group_id, group_data), stats in zip(groups.items(), all_stats):
+        group_name = group_data.get("group_name", str(group_id))
         
-        stats_text += f"*{group_name}*\n"
-        stats_text += f"  👥 Members: {stats['total_members']}\n"
-        stats_text += f"  ➕ Invited: {stats['total_invited']}\n"
-        stats_text += f"  🏆 Inviters: {stats['active_inviters']}\n\n"
+        lines += [
+            f"*{group_name}*",
+            f"  👥 Members: {stats['total_members']}",
+            f"  ➕ Invited: {stats['total_invited']}",
+            f"  🏆 Inviters: {stats['active_inviters']}",
+            "",
+        ]
     
-    await update.message.reply_text(stats_text, parse_mode="Markdown")
+    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
 
 
 async def close_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -496,12 +1071,99 @@ async def close_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     try:
         await query.message.delete()
     except Exception as e:
-        logger.error(f"Error deleting message: {e}")
+        logger.error("Error deleting message: %s", e)
+
+
+# -------------------------------
+# 🔎 Filters
+# -------------------------------
+class HumanJoinFilter(filters.MessageFilter):
+    """Match join messages that add at least one human member"""
+
+    def filter(self, message) -> bool:
+        return any(not member.is_bot for member in message.new_chat_members)
+
+
+HUMAN_JOINS = HumanJoinFilter(name="HUMAN_JOINS")
+
+
+# -------------------------------
+# 🚦 Update Processing
+# -------------------------------
+MAX_CONCURRENT_UPDATES = 256
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Process updates from different chats concurrently, keeping per-chat order"""
+
+    def __init__(self, max_concurrent_updates: int):
+        # process_update takes the base class semaphore before
+        # do_process_update, so it is left unbounded and the real limit is
+        # applied after the chat lock instead
+        super().__init__(sys.maxsize)
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._chat_locks: dict = {}  # chat_id -> [asyncio.Lock, number of holders and waiters]
+
+    async def do_process_update(self, update, coroutine) -> None:
+        # The chat lock is taken before a concurrency slot, so updates queued
+        # behind a busy chat don't hold slots other chats could use
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        entry = self._chat_locks.get(chat.id)
+        if entry is None:
+            entry = self._chat_locks[chat.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0], self._slots:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chat_locks[chat.id]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
 
 
 # -------------------------------
 # 🧠 Main Function
 # -------------------------------
+async def post_init(app: Application) -> None:
+    """Start background tasks once the application is initialized"""
+    # Threads used by asyncio.to_thread for blocking Firestore calls
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=DB_WORKERS))
+    app.bot_data["flusher"] = asyncio.create_task(write_buffer_flusher())
+    try:
+        app.bot_data["groups_watch"] = await asyncio.to_thread(watch_groups)
+    except Exception as e:
+        logger.error("Error watching groups, falling back to polling: %s", e)
+    else:
+        # Warm the groups cache before the first update is processed
+        if not await asyncio.to_thread(_groups_loaded.wait, GROUPS_LOAD_TIMEOUT):
+            logger.warning("Groups not loaded after %ss, starting with a cold cache", GROUPS_LOAD_TIMEOUT)
+
+
+async def post_shutdown(app: Application) -> None:
+    """Stop background tasks and flush pending writes"""
+    flusher = app.bot_data.pop("flusher", None)
+    if flusher:
+        flusher.cancel()
+        # A flush in progress finishes its batch or re-queues its writes first
+        await asyncio.gather(flusher, return_exceptions=True)
+    groups_watch = app.bot_data.pop("groups_watch", None)
+    if groups_watch:
+        groups_watch.unsubscribe()
+    # Groups inside their touch interval are written now rather than later
+    await flush_pending_writes(force=True)
+
+
 def main():
     """Initialize and run the bot"""
     token = os.environ.get('BOT_TOKEN')
@@ -510,8 +1172,25 @@ def main():
         logger.error("BOT_TOKEN environment variable not set!")
         raise ValueError("Bot token not configured")
     
+    # Faster event loop for the Telegram and Firestore I/O, where available
+    if uvloop:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    
     # Build application
-    app = Application.builder().token(token).build()
+    app = (
+        Application.builder()
+        .token(token)
+        .concurrent_updates(PerChatUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        .rate_limiter(AIORateLimiter(max_retries=3))
+        # One connection per concurrently processed update
+        .connection_pool_size(MAX_CONCURRENT_UPDATES)
+        .connect_timeout(5)
+        .read_timeout(10)
+        .pool_timeout(5)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
     
     # Command handlers
     app.add_handler(CommandHandler("start", start))
@@ -521,15 +1200,26 @@ def main():
     app.add_handler(CommandHandler("groupstats", group_stats))
     
     # Message handlers
-    app.add_handler(MessageHandler(filters.StatusUpdate.NEW_CHAT_MEMBERS, handle_new_members))
+    app.add_handler(MessageHandler(
+        filters.StatusUpdate.NEW_CHAT_MEMBERS & filters.ChatType.GROUPS & HUMAN_JOINS,
+        handle_new_members
+    ))
+    
+    # Chat member handlers
+    app.add_handler(ChatMemberHandler(handle_bot_membership, ChatMemberHandler.MY_CHAT_MEMBER))
+    app.add_handler(ChatMemberHandler(handle_admin_change, ChatMemberHandler.CHAT_MEMBER))
     
     # Callback query handlers
-    app.add_handler(CallbackQueryHandler(show_leaderboard, pattern="^leaderboard_"))
+    app.add_handler(CallbackQueryHandler(show_leaderboard, pattern=r"^leaderboard_(-?\d+)$"))
     app.add_handler(CallbackQueryHandler(close_message, pattern="^close$"))
     
     # Start bot
     logger.info("🤖 Bot started with Firebase backend...")
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+    app.run_polling(
+        poll_interval=0.0,
+        timeout=30,
+        allowed_updates=[Update.MESSAGE, Update.CALLBACK_QUERY, Update.MY_CHAT_MEMBER, Update.CHAT_MEMBER],
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,254 @@
+import asyncio
+import os
+import sys
+import threading
+import types
+import unittest
+from itertools import count
+from unittest import mock
+
+
+# -------------------------------
+# 🧪 Fake Telegram and Firestore
+# -------------------------------
+# bot.py connects to Firebase at import time, so the SDKs are replaced with
+# just enough of their surface to import it and record batched writes
+class Increment:
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return isinstance(other, Increment) and other.value == self.value
+
+    def __repr__(self):
+        return f"Increment({self.value})"
+
+
+class FakeRef:
+    _ids = count()
+
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+
+    def collection(self, name):
+        return FakeCollection(self.db, f"{self.path}/{name}")
+
+
+class FakeCollection:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+
+    def document(self, doc_id=None):
+        doc_id = doc_id if doc_id is not None else f"auto{next(FakeRef._ids)}"
+        return FakeRef(self.db, f"{self.path}/{doc_id}")
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db = db
+        self.writes = []
+
+    def set(self, ref, data, merge=False):
+        self.writes.append((ref.path, data))
+
+    def commit(self):
+        if self.db.gate:
+            self.db.gate.wait()
+        if self.db.failures:
+            self.db.failures -= 1
+            raise RuntimeError("commit failed")
+        self.db.commits.append(self.writes)
+
+
+class FakeDB:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.commits = []
+        self.failures = 0
+        self.gate = None
+
+    def collection(self, name):
+        return FakeCollection(self, name)
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def writes_to(self, path):
+        return [data for batch in self.commits for ref_path, data in batch if ref_path == path]
+
+
+def install_fakes(fake_db):
+    telegram = types.ModuleType("telegram")
+    telegram.Update = telegram.InlineKeyboardButton = telegram.InlineKeyboardMarkup = mock.MagicMock()
+
+    ext = types.ModuleType("telegram.ext")
+    for name in ("AIORateLimiter", "Application", "ApplicationBuilder", "CommandHandler",
+                 "MessageHandler", "CallbackQueryHandler", "ChatMemberHandler", "ContextTypes"):
+        setattr(ext, name, mock.MagicMock())
+    ext.BaseUpdateProcessor = type("BaseUpdateProcessor", (), {"__init__": lambda self, *args: None})
+    ext.filters = mock.MagicMock()
+    ext.filters.MessageFilter = type("MessageFilter", (), {"__init__": lambda self, name=None: None})
+
+    firestore = types.SimpleNamespace(
+        client=lambda: fake_db,
+        Increment=Increment,
+        SERVER_TIMESTAMP="SERVER_TIMESTAMP",
+        DELETE_FIELD="DELETE_FIELD",
+    )
+    firebase_admin = types.ModuleType("firebase_admin")
+    firebase_admin.firestore = firestore
+    firebase_admin.initialize_app = lambda cred: None
+    firebase_admin.credentials = types.SimpleNamespace(Certificate=lambda cred: cred)
+
+    exceptions = types.ModuleType("google.api_core.exceptions")
+    exceptions.AlreadyExists = type("AlreadyExists", (Exception,), {})
+
+    sys.modules.update({
+        "telegram": telegram,
+        "telegram.ext": ext,
+        "firebase_admin": firebase_admin,
+        "google": types.ModuleType("google"),
+        "google.api_core": types.ModuleType("google.api_core"),
+        "google.api_core.exceptions": exceptions,
+    })
+
+
+db = FakeDB()
+with mock.patch.dict(sys.modules), mock.patch.dict(os.environ, FIREBASE_CREDENTIALS="{}"):
+    install_fakes(db)
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+    import bot
+
+
+# -------------------------------
+# ⏱️ Write Buffer Tests
+# -------------------------------
+GROUP = "groups/1"
+INVITER = "groups/1/inviters/10"
+
+
+class WriteBufferTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        db.reset()
+        for state in (bot._dirty_groups, bot._group_touched, bot._deferred_touches,
+                      bot._pending_invites, bot._pending_names, bot._invite_counts, bot._pending_joins):
+            state.clear()
+        patcher = mock.patch.object(bot, "get_inviter_count", return_value=0)
+        self.get_inviter_count = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_invites_are_coalesced_into_one_increment(self):
+        self.assertEqual(await bot.record_invites(1, 10, "Ann"), 1)
+        self.assertEqual(await bot.record_invites(1, 10, amount=2), 3)
+        await bot.flush_pending_writes()
+
+        self.assertEqual(len(db.commits), 1)
+        [data] = db.writes_to(INVITER)
+        self.assertEqual(data["invite_count"], Increment(3))
+        self.assertEqual(data["user_name"], "Ann")
+        self.get_inviter_count.assert_called_once_with(1, 10)
+
+    async def test_flushed_counts_are_evicted(self):
+        await bot.record_invites(1, 10)
+        await bot.flush_pending_writes()
+        self.assertEqual(bot._invite_counts, {})
+
+    async def test_failed_commit_is_requeued(self):
+        db.failures = 1
+        await bot.record_invites(1, 10, "Ann")
+        await bot.flush_pending_writes()
+        await bot.record_invites(1, 10)
+
+        self.assertEqual(db.commits, [])
+        self.assertEqual(bot._pending_invites[(1, 10)], {"amount": 2, "user_name": "Ann"})
+        self.assertEqual(bot._invite_counts[(1, 10)], 2)
+
+        await bot.flush_pending_writes()
+        [data] = db.writes_to(INVITER)
+        self.assertEqual(data["invite_count"], Increment(2))
+        self.assertEqual(bot._pending_invites, {})
+
+    async def test_cancelled_flush_waits_for_the_batch_in_flight(self):
+        db.gate = threading.Event()
+        await bot.record_invites(1, 10)
+        flush = asyncio.create_task(bot.flush_pending_writes())
+        await asyncio.sleep(0.05)
+        flush.cancel()
+        await asyncio.sleep(0.05)
+        self.assertFalse(flush.done())
+
+        db.gate.set()
+        with self.assertRaises(asyncio.CancelledError):
+            await flush
+        self.assertEqual(len(db.writes_to(INVITER)), 1)
+        self.assertEqual(bot._pending_invites, {})
+
+    async def test_cancelled_flush_requeues_a_failed_batch(self):
+        db.gate = threading.Event()
+        db.failures = 1
+        await bot.record_invites(1, 10)
+        flush = asyncio.create_task(bot.flush_pending_writes())
+        await asyncio.sleep(0.05)
+        flush.cancel()
+        db.gate.set()
+        with self.assertRaises(asyncio.CancelledError):
+            await flush
+
+        self.assertEqual(db.commits, [])
+        self.assertEqual(bot._pending_invites[(1, 10)], {"amount": 1})
+
+    async def test_joins_inside_the_interval_share_one_group_write(self):
+        bot.record_joins(1, [(20, None)])
+        await bot.flush_pending_writes()
+        self.assertEqual(len(db.writes_to(GROUP)), 1)
+
+        for user_id in range(21, 26):
+            bot.record_joins(1, [(user_id, 10)])
+            await bot.flush_pending_writes()
+        self.assertEqual(len(db.writes_to(GROUP)), 1)
+        self.assertEqual(len(bot._deferred_touches), 1)
+
+        # The deferred touch fires once the interval is over
+        bot._group_touched[1] -= bot.GROUP_TOUCH_INTERVAL
+        bot._touch_group(1)
+        await bot.flush_pending_writes()
+
+        day = next(iter(db.writes_to(GROUP)[0]["daily_joins"]))
+        self.assertEqual(len(db.commits), 7)
+        self.assertEqual(db.writes_to(GROUP)[1], {
+            "last_updated": "SERVER_TIMESTAMP",
+            "total_members": Increment(5),
+            "daily_joins": {day: Increment(5)},
+            "total_invited": Increment(5),
+            "daily_invited": {day: Increment(5)},
+        })
+
+    async def test_shutdown_flush_writes_held_groups(self):
+        bot._group_touched[1] = bot.time.monotonic()
+        await bot.record_invites(1, 10)
+        await bot.flush_pending_writes()
+        self.assertEqual(db.writes_to(GROUP), [])
+
+        await bot.flush_pending_writes(force=True)
+        [data] = db.writes_to(GROUP)
+        self.assertEqual(data["active_inviters"], Increment(1))
+
+    async def test_failed_group_write_keeps_its_counters(self):
+        db.failures = 1
+        bot.record_joins(1, [(20, 10), (21, None)])
+        await bot.flush_pending_writes()
+        bot.record_joins(1, [(22, None)])
+        await bot.flush_pending_writes()
+
+        [data] = db.writes_to(GROUP)
+        self.assertEqual(data["total_members"], Increment(3))
+        self.assertEqual(data["total_invited"], Increment(1))
+        self.assertEqual(len([path for batch in db.commits for path, _ in batch if "member_joins" in path]), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()